@@ -49,5 +49,9 @@ class _MapDatasetFetcher(_DatasetFetcher):
         super(_MapDatasetFetcher, self).__init__(dataset, collate_fn, drop_last)
 
     def fetch(self, batch_indices):
-        data = [self.dataset[idx] for idx in batch_indices]
+        # datasets can load a whole batch at once, e.g. concurrently
+        if hasattr(self.dataset, '__getitems__'):
+            data = self.dataset.__getitems__(batch_indices)
+        else:
+            data = [self.dataset[idx] for idx in batch_indices]
         return self.collate_fn(data)
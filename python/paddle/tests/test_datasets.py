@@ -17,9 +17,16 @@ import os
 import numpy as np
 import tempfile
 import shutil
+import pickle
 import cv2
+import threading
+from unittest import mock
 
+import paddle.fluid as fluid
+from paddle.io import DataLoader
+from paddle.fluid.dataloader.fetcher import _MapDatasetFetcher
 from paddle.vision.datasets import *
+from paddle.vision.datasets import folder
 from paddle.dataset.common import _check_exists_and_download
 
 
@@ -46,6 +53,12 @@ class TestFolderDatasets(unittest.TestCase):
 
         assert len(dataset_folder) == 4
         assert len(dataset_folder.classes) == 2
+        assert dataset_folder.targets.dtype == np.uint8
+        assert dataset_folder.targets.tolist() == [0, 0, 1, 1]
+        assert dataset_folder.samples[2] == (dataset_folder.sample_paths[2], 1)
+        assert len(dataset_folder.samples) == 4
+        assert dataset_folder.samples == list(dataset_folder.samples)
+        assert isinstance(dataset_folder[3][1], int)
 
         dataset_folder = DatasetFolder(self.data_dir)
         for _ in dataset_folder:
@@ -63,6 +76,280 @@ class TestFolderDatasets(unittest.TestCase):
 
         assert len(loader) == 4
 
+    def test_nested_folder(self):
+        sub_dir = os.path.join(self.data_dir, 'class_0', 'nested')
+        os.makedirs(sub_dir)
+        fake_img = (np.random.random((32, 32, 3)) * 255).astype('uint8')
+        cv2.imwrite(os.path.join(sub_dir, '0.jpg'), fake_img)
+
+        dataset_folder = DatasetFolder(self.data_dir)
+        assert len(dataset_folder) == 5
+        paths = [s[0] for s in dataset_folder.samples]
+        assert paths[2] == os.path.join(sub_dir, '0.jpg')
+
+        loader = ImageFolder(self.data_dir)
+        assert len(loader) == 5
+
+    def test_sorted_order(self):
+        class_dir = os.path.join(self.data_dir, 'class_0')
+        for name in [('z.jpg', ), ('m', 'b.jpg'), ('m-x', 'c.jpg')]:
+            path = os.path.join(class_dir, *name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            fake_img = (np.random.random((32, 32, 3)) * 255).astype('uint8')
+            cv2.imwrite(path, fake_img)
+
+        expected = [('0.jpg', ), ('1.jpg', ), ('z.jpg', ), ('m', 'b.jpg'),
+                    ('m-x', 'c.jpg')]
+        expected = [os.path.join(class_dir, *name) for name in expected]
+        dataset_folder = DatasetFolder(self.data_dir)
+        assert dataset_folder.sample_paths[:5] == expected
+
+        loader = ImageFolder(self.data_dir)
+        assert loader.samples[:5] == expected
+
+    def test_getitems(self):
+        dataset_folder = DatasetFolder(self.data_dir)
+        batch = dataset_folder.__getitems__([0, 3])
+        assert len(batch) == 2
+        assert [target for _, target in batch] == [0, 1]
+
+        loader = ImageFolder(self.data_dir)
+        batch = loader.__getitems__([1, 2])
+        assert len(batch) == 2
+        assert batch[0][0].shape == (32, 32, 3)
+
+    def test_getitems_subclass(self):
+        threads = set()
+
+        class RelabeledFolder(DatasetFolder):
+            def __getitem__(self, index):
+                threads.add(threading.current_thread())
+                sample, target = super(RelabeledFolder, self).__getitem__(index)
+                return sample, target + 100
+
+        dataset_folder = RelabeledFolder(self.data_dir)
+        batch = dataset_folder.__getitems__([0, 3])
+        assert [target for _, target in batch] == [100, 101]
+        # an overridden __getitem__ is only called on the calling thread
+        assert threads == set([threading.current_thread()])
+
+    def test_getitems_serial(self):
+        dataset_folder = DatasetFolder(self.data_dir, num_threads=0)
+        batch = dataset_folder.__getitems__([0, 3])
+        assert [target for _, target in batch] == [0, 1]
+        assert dataset_folder._tpool is None
+
+        loader = ImageFolder(self.data_dir, num_threads=0)
+        batch = loader.__getitems__([1, 2])
+        assert batch[0][0].shape == (32, 32, 3)
+        assert loader._tpool is None
+
+    def test_fetcher(self):
+        dataset_folder = DatasetFolder(self.data_dir)
+        fetcher = _MapDatasetFetcher(dataset_folder,
+                                     collate_fn=lambda batch: batch,
+                                     drop_last=False)
+        batch = fetcher.fetch([2, 0])
+        for (sample, target), index in zip(batch, [2, 0]):
+            expected_sample, expected_target = dataset_folder[index]
+            assert target == expected_target
+            assert np.array_equal(sample, expected_sample)
+
+    def test_set_samples(self):
+        dataset_folder = DatasetFolder(self.data_dir)
+        paths = dataset_folder.sample_paths
+        dataset_folder.samples = [(paths[0], 0), (paths[1], 300)]
+        assert dataset_folder.targets.dtype == np.uint16
+        assert dataset_folder[1][1] == 300
+
+        dataset_folder.samples = [(paths[0], -1), (paths[1], 1)]
+        assert dataset_folder.targets.tolist() == [-1, 1]
+        dataset_folder.samples = [(paths[0], 0.5), (paths[1], 1.5)]
+        assert dataset_folder.targets.tolist() == [0.5, 1.5]
+
+    def test_unsorted(self):
+        dataset_folder = DatasetFolder(self.data_dir)
+        unsorted_folder = DatasetFolder(self.data_dir, sort=False)
+        assert sorted(unsorted_folder.samples) == dataset_folder.samples
+
+        loader = ImageFolder(self.data_dir)
+        unsorted_loader = ImageFolder(self.data_dir, sort=False)
+        assert sorted(unsorted_loader.samples) == loader.samples
+
+    def test_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache_path = os.path.join(cache_dir, 'index.pkl')
+            dataset_folder = DatasetFolder(self.data_dir, cache_path=cache_path)
+            assert os.path.exists(cache_path)
+            cached_folder = DatasetFolder(self.data_dir, cache_path=cache_path)
+            assert cached_folder.samples == dataset_folder.samples
+            assert cached_folder.class_to_idx == dataset_folder.class_to_idx
+
+            # renamed classes invalidate the cache even if the modification
+            # time of root is restored
+            stat = os.stat(self.data_dir)
+            os.rename(os.path.join(self.data_dir, 'class_1'),
+                      os.path.join(self.data_dir, 'class_2'))
+            os.utime(self.data_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            renamed_folder = DatasetFolder(self.data_dir, cache_path=cache_path)
+            assert renamed_folder.classes == ['class_0', 'class_2']
+            assert all(os.path.exists(p) for p in renamed_folder.sample_paths)
+
+            cache_path = os.path.join(cache_dir, 'image_index.pkl')
+            loader = ImageFolder(self.data_dir, cache_path=cache_path)
+            assert os.path.exists(cache_path)
+            cached_loader = ImageFolder(self.data_dir, cache_path=cache_path)
+            assert cached_loader.samples == loader.samples
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_cache_errors(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            # a cache written by another dataset class is rebuilt
+            cache_path = os.path.join(cache_dir, 'index.pkl')
+            DatasetFolder(self.data_dir, cache_path=cache_path)
+            loader = ImageFolder(self.data_dir, cache_path=cache_path)
+            assert len(loader) == 4
+            assert isinstance(loader.samples[0], str)
+            dataset_folder = DatasetFolder(self.data_dir, cache_path=cache_path)
+            assert len(dataset_folder) == 4
+
+            # a cache which can not be unpickled is rebuilt
+            with open(cache_path, 'wb') as f:
+                f.write(b'cmissing_module\nname\n.')
+            dataset_folder = DatasetFolder(self.data_dir, cache_path=cache_path)
+            assert len(dataset_folder) == 4
+
+            # a cache built without is_valid_file is not used with it
+            def is_valid_file(path):
+                return os.path.basename(path) == '0.jpg'
+
+            dataset_folder = DatasetFolder(self.data_dir,
+                                           is_valid_file=is_valid_file,
+                                           cache_path=cache_path)
+            assert len(dataset_folder) == 2
+
+            # a cache which can not be written only warns
+            cache_path = os.path.join(cache_dir, 'dir')
+            os.makedirs(cache_path)
+            with self.assertWarns(UserWarning):
+                dataset_folder = DatasetFolder(self.data_dir,
+                                               cache_path=cache_path)
+            assert len(dataset_folder) == 4
+            assert sorted(os.listdir(cache_dir)) == ['dir', 'index.pkl']
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_prefetch(self):
+        dataset_folder = DatasetFolder(self.data_dir)
+        prefetch_folder = DatasetFolder(self.data_dir, prefetch=2)
+        for i in range(len(prefetch_folder)):
+            sample, target = prefetch_folder[i]
+            expected_sample, expected_target = dataset_folder[i]
+            assert target == expected_target
+            assert np.array_equal(sample, expected_sample)
+
+        # samples in index order read the following samples ahead, others
+        # read nothing ahead until the access starts again at the first one
+        prefetch_folder = DatasetFolder(self.data_dir, prefetch=2)
+        paths = prefetch_folder.sample_paths
+        prefetch_folder[0]
+        assert prefetch_folder._prefetcher._pending == set(paths[1:3])
+        prefetch_folder[3]
+        prefetch_folder[2]
+        assert prefetch_folder._prefetcher._pending == set(paths[1:2])
+        prefetch_folder[0]
+        assert prefetch_folder._prefetcher._pending == set(paths[1:3])
+
+        sample, target = pickle.loads(pickle.dumps(prefetch_folder))[1]
+        assert target == dataset_folder[1][1]
+        assert np.array_equal(sample, dataset_folder[1][0])
+
+        with self.assertRaises(ValueError):
+            DatasetFolder(self.data_dir, loader=cv2.imread, prefetch=2)
+
+    def test_prefetch_batches(self):
+        dataset_folder = DatasetFolder(self.data_dir)
+        prefetch_folder = DatasetFolder(self.data_dir, prefetch=2)
+        batch = prefetch_folder.__getitems__([0, 1])
+        # batches in index order read the following samples ahead
+        paths = prefetch_folder.sample_paths
+        assert prefetch_folder._prefetcher._pending == set(paths[2:4])
+        batch += prefetch_folder.__getitems__([2, 3])
+        for i, (sample, target) in enumerate(batch):
+            expected_sample, expected_target = dataset_folder[i]
+            assert target == expected_target
+            assert np.array_equal(sample, expected_sample)
+
+        # shuffled batches read nothing ahead
+        shuffled_folder = DatasetFolder(self.data_dir, prefetch=2)
+        batch = shuffled_folder.__getitems__([3, 0])
+        assert len(shuffled_folder._prefetcher._pending) == 0
+        assert [target for _, target in batch] == [1, 0]
+
+    def test_prefetch_workers(self):
+        # the second of two workers is handed every other batch of one
+        # sample, starting at index 1
+        worker_info = mock.Mock(id=1, num_workers=2)
+        with mock.patch.object(folder,
+                               'get_worker_info',
+                               return_value=worker_info):
+            prefetch_folder = DatasetFolder(self.data_dir, prefetch=2)
+            prefetch_folder.__getitems__([1])
+            paths = prefetch_folder.sample_paths
+            assert prefetch_folder._prefetcher._pending == set([paths[3]])
+            batch = prefetch_folder.__getitems__([3])
+        assert [target for _, target in batch] == [1]
+
+    def test_uring_loader(self):
+        with self.assertRaises(ValueError):
+            DatasetFolder(self.data_dir, loader='mmap')
+        try:
+            import liburing
+        except ImportError:
+            self.skipTest("liburing is not installed")
+
+        dataset_folder = DatasetFolder(self.data_dir)
+        uring_folder = DatasetFolder(self.data_dir, loader='io_uring')
+        batch = uring_folder.__getitems__([0, 1, 2, 3])
+        for i, (sample, target) in enumerate(batch):
+            expected_sample, expected_target = dataset_folder[i]
+            assert target == expected_target
+            assert np.array_equal(sample, expected_sample)
+
+        loader = ImageFolder(self.data_dir, loader='io_uring')
+        batch = loader.__getitems__([0, 1])
+        assert batch[0][0].shape == (32, 32, 3)
+
+    def test_lazy(self):
+        dataset_folder = LazyDatasetFolder(self.data_dir)
+        assert dataset_folder.classes == ['class_0', 'class_1']
+        targets = [target for _, target in dataset_folder]
+        assert sorted(targets) == [0, 0, 1, 1]
+        with self.assertRaises(TypeError):
+            len(dataset_folder)
+
+        loader = LazyImageFolder(self.data_dir)
+        samples = list(loader)
+        assert len(samples) == 4
+        assert samples[0][0].shape == (32, 32, 3)
+
+    def test_lazy_dataloader(self):
+        with fluid.dygraph.guard(fluid.CPUPlace()):
+            dataset_folder = LazyDatasetFolder(self.data_dir)
+            data_loader = DataLoader(dataset_folder,
+                                     places=fluid.CPUPlace(),
+                                     batch_size=2,
+                                     return_list=True)
+            num_samples = 0
+            for images, targets in data_loader:
+                assert list(images.shape[1:]) == [32, 32, 3]
+                num_samples += images.shape[0]
+            assert num_samples == 4
+
     def test_transform(self):
         def fake_transform(img):
             return img
@@ -77,6 +364,68 @@ class TestFolderDatasets(unittest.TestCase):
         for _ in loader:
             pass
 
+    def test_set_transform(self):
+        dataset_folder = DatasetFolder(self.data_dir)
+        assert dataset_folder[0][0].shape == (32, 32, 3)
+
+        dataset_folder.transform = lambda img: img[:16]
+        assert dataset_folder[0][0].shape == (16, 32, 3)
+
+    def test_view_transform(self):
+        dataset_folder = DatasetFolder(self.data_dir,
+                                       transform=lambda img: img[..., ::-1])
+        first, _ = dataset_folder[0]
+        batch = dataset_folder.__getitems__([0, 1, 2, 3])
+        assert np.array_equal(batch[0][0], first)
+        for i in range(1, 4):
+            assert not np.shares_memory(batch[0][0], batch[i][0])
+
+    def test_is_valid_file(self):
+        def is_valid_file(path):
+            return os.path.basename(path) == '0.jpg'
+
+        dataset_folder = DatasetFolder(self.data_dir,
+                                       is_valid_file=is_valid_file)
+        assert len(dataset_folder) == 2
+
+        loader = ImageFolder(self.data_dir, is_valid_file=is_valid_file)
+        assert len(loader) == 2
+
+        def check_file(path):
+            raise IOError("corrupt file: " + path)
+
+        with self.assertRaises(IOError):
+            DatasetFolder(self.data_dir, is_valid_file=check_file)
+        with self.assertRaises(IOError):
+            ImageFolder(self.data_dir, is_valid_file=check_file)
+
+    def test_extensions(self):
+        class_dir = os.path.join(self.data_dir, 'class_0')
+        fake_img = (np.random.random((32, 32, 3)) * 255).astype('uint8')
+        cv2.imwrite(os.path.join(class_dir, '2.JPG'), fake_img)
+        with open(os.path.join(class_dir, 'labels.txt'), 'w') as f:
+            f.write('0')
+
+        dataset_folder = DatasetFolder(self.data_dir)
+        assert len(dataset_folder) == 5
+        dataset_folder = DatasetFolder(self.data_dir, extensions=('.JPG', ))
+        assert len(dataset_folder) == 5
+        # the extension filter does not keep the dataset from being pickled
+        dataset_folder = pickle.loads(pickle.dumps(dataset_folder))
+        assert len(dataset_folder) == 5
+        loader = ImageFolder(self.data_dir, extensions='.txt')
+        assert len(loader) == 1
+
+    def test_cv2_loader(self):
+        path = os.path.join(self.data_dir, 'class_0', '0.jpg')
+        assert np.array_equal(folder.cv2_loader(path), cv2.imread(path))
+
+        empty_path = os.path.join(self.data_dir, 'empty.jpg')
+        open(empty_path, 'wb').close()
+        assert folder.cv2_loader(empty_path) is None
+        with self.assertRaises(OSError):
+            folder.cv2_loader(os.path.join(self.data_dir, 'missing.jpg'))
+
     def test_errors(self):
         with self.assertRaises(RuntimeError):
             ImageFolder(self.empty_dir)
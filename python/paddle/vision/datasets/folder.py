@@ -14,11 +14,40 @@
 
 import os
 import sys
+import queue
+import pickle
+import hashlib
+import weakref
+import operator
+import itertools
+import threading
+import warnings
+import functools
+import collections
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
+import numpy as np
+
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+from paddle.io import Dataset, IterableDataset, get_worker_info
 
-from paddle.io import Dataset
+__all__ = [
+    "DatasetFolder", "ImageFolder", "LazyDatasetFolder", "LazyImageFolder"
+]
 
-__all__ = ["DatasetFolder", "ImageFolder"]
+# os.fwalk and os.posix_fadvise are only available on POSIX platforms
+_HAS_FWALK = hasattr(os, 'fwalk')
+_HAS_FADVISE = hasattr(os, 'posix_fadvise')
+
+# below this many entries under root, the class folders are found on the
+# calling thread, where it is cheaper than dispatching to threads
+_PARALLEL_SCAN_THRESHOLD = 32
 
 
 def has_valid_extension(filename, extensions):
@@ -34,27 +63,425 @@ def has_valid_extension(filename, extensions):
     return filename.lower().endswith(extensions)
 
 
-def make_dataset(dir, class_to_idx, extensions, is_valid_file=None):
-    images = []
+def _iter_files(top, extensions=None, path_filter=None):
+    """Yields the path of every file under `top` whose name ends with one of
+    the lowercase `extensions`, ignoring case, and whose path passes
+    `path_filter`, if given. The path of a file is only built once its name
+    has passed.
+
+    On POSIX the tree is walked with `os.fwalk`, which lists each directory
+    through a file descriptor relative to its parent's instead of resolving
+    the full path again. Elsewhere an explicit stack of `os.scandir` calls
+    is used. Both use the file type cached in each directory entry instead
+    of an extra `stat` per path. Paths are yielded in directory order and
+    symlinked directories are followed. A `top` which is missing or not a
+    directory yields nothing.
+    """
+    if _HAS_FWALK:
+        # errors below `top` are ignored by fwalk, only opening `top` raises,
+        # and errors raised by the filters are left to the caller
+        if not os.path.isdir(top):
+            return
+        for root, _, fnames, _ in os.fwalk(top, follow_symlinks=True):
+            # fnames are plain basenames, so a separator joined once per
+            # directory spares os.path.join for every file
+            if not root.endswith(os.sep):
+                root += os.sep
+            for fname in fnames:
+                if extensions is None or fname.lower().endswith(extensions):
+                    path = root + fname
+                    if path_filter is None or path_filter(path):
+                        yield path
+        return
+
+    stack = [top]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        # closes the directory even if the walk is abandoned part way
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=True):
+                    stack.append(entry.path)
+                elif ((extensions is None
+                       or entry.name.lower().endswith(extensions))
+                      and (path_filter is None or path_filter(entry.path))):
+                    yield entry.path
+
+
+def _target_dtype(num_classes):
+    """Returns the smallest integer dtype which holds `num_classes` class
+    indices.
+    """
+    if num_classes <= 1 << 8:
+        return np.uint8
+    if num_classes <= 1 << 16:
+        return np.uint16
+    if num_classes <= 1 << 31:
+        return np.int32
+    return np.int64
+
+
+def _file_filters(extensions, is_valid_file):
+    """Returns the (extensions, path_filter) of `_iter_files` which select
+    the sample files of a dataset. Extensions are checked on the file names,
+    a caller's is_valid_file is given the path of every file passing them.
+    """
+    if extensions is None and is_valid_file is None:
+        raise ValueError("extensions and is_valid_file should not both be None")
+    if isinstance(extensions, str):
+        extensions = (extensions, )
+    if extensions is not None:
+        extensions = tuple(e.lower() for e in extensions)
+    return extensions, is_valid_file
+
+
+def _no_samples_error(root, extensions):
+    msg = "Found 0 files in subfolders of: " + root
+    if extensions is not None:
+        msg += "\nSupported extensions are: " + ",".join(extensions)
+    return RuntimeError(msg)
+
+
+def _make_dataset(dir, class_to_idx, file_filters, sort):
+    """Returns the samples under `dir` as a list of paths and an array of
+    the class index of each path, typed by `_target_dtype`.
+    """
     dir = os.path.expanduser(dir)
 
+    def scan_class(target):
+        paths = list(_iter_files(os.path.join(dir, target), *file_filters))
+        if sort:
+            # sorted by directory, then by file name within each directory
+            paths.sort(key=os.path.split)
+        return paths
+
+    classes = sorted(class_to_idx.keys())
+    class_paths = []
+    if len(classes) > 0:
+        # directory listing is I/O bound and releases the GIL, so class
+        # folders can be scanned concurrently with threads
+        with ThreadPoolExecutor(max_workers=min(32, len(classes))) as executor:
+            class_paths = list(executor.map(scan_class, classes))
+
+    # the sample count of every class is known now, so the targets are
+    # filled into a preallocated array class by class
+    paths = []
+    targets = np.empty(sum(len(p) for p in class_paths),
+                       dtype=_target_dtype(len(classes)))
+    for target, p in zip(classes, class_paths):
+        targets[len(paths):len(paths) + len(p)] = class_to_idx[target]
+        paths.extend(p)
+
+    return paths, targets
+
+
+def make_dataset(dir, class_to_idx, extensions, is_valid_file=None, sort=True):
+    paths, targets = _make_dataset(dir, class_to_idx,
+                                   _file_filters(extensions, is_valid_file),
+                                   sort)
+    return list(zip(paths, targets.tolist()))
+
+
+# bumped whenever the layout of the cached index changes
+_CACHE_VERSION = 1
+
+
+def _cache_key(dataset,
+               root,
+               extensions,
+               is_valid_file,
+               sort,
+               class_to_idx=None):
+    """Returns the key the index `dataset` builds from `root` is cached
+    under.
+
+    The key holds the class name of `dataset`, since every dataset class
+    caches an index of its own layout, and the modification time of `root`,
+    so adding, removing or renaming entries directly under `root`
+    invalidates the cache. It also holds the `_filter_name` of
+    `is_valid_file`, so an index filtered by one function is not reused
+    with another one or without any. If `class_to_idx` is given, the key
+    also holds its `_classes_digest`, which invalidates the cache whenever
+    the classes differ even if the modification time does not, e.g. for a
+    tree copied with its timestamps. Changes deeper in the tree are not
+    detected.
+    """
+    root = os.path.abspath(os.path.expanduser(root))
     if extensions is not None:
+        extensions = tuple(extensions)
+    digest = None
+    if class_to_idx is not None:
+        digest = _classes_digest(class_to_idx)
+    return (_CACHE_VERSION, type(dataset).__name__,
+            root, os.stat(root).st_mtime_ns, extensions,
+            _filter_name(is_valid_file), sort, digest)
 
-        def is_valid_file(x):
-            return has_valid_extension(x, extensions)
 
-    for target in sorted(class_to_idx.keys()):
-        d = os.path.join(dir, target)
-        if not os.path.isdir(d):
-            continue
-        for root, _, fnames in sorted(os.walk(d, followlinks=True)):
-            for fname in sorted(fnames):
-                path = os.path.join(root, fname)
-                if is_valid_file(path):
-                    item = (path, class_to_idx[target])
-                    images.append(item)
+def _filter_name(is_valid_file):
+    """Returns the module and qualified name of `is_valid_file`, or None if
+    it is None. Functions can not be compared across processes, so a
+    changed function body under the same name is not detected.
+    """
+    if is_valid_file is None:
+        return None
+    qualname = getattr(is_valid_file, '__qualname__',
+                       type(is_valid_file).__qualname__)
+    return getattr(is_valid_file, '__module__', None), qualname
+
+
+def _classes_digest(class_to_idx):
+    """Returns a stable SHA-1 of the (class_name, class_index) items of
+    `class_to_idx` in their order, which changes whenever a class is added,
+    removed, renamed or reordered.
+    """
+    sha = hashlib.sha1()
+    for name, index in class_to_idx.items():
+        item = "{}\0{}\0".format(name, index)
+        sha.update(item.encode('utf-8', 'surrogateescape'))
+    return sha.hexdigest()
+
+
+def _load_cache(cache_path, key, size):
+    """Returns the index cached at `cache_path`, a tuple of `size` items, or
+    None if there is no cache, it was stored under a key other than `key` or
+    it does not hold such a tuple.
+    """
+    if cache_path is None or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_key, index = pickle.load(f)
+    except Exception:
+        # a truncated or foreign pickle can raise nearly any error, e.g.
+        # ModuleNotFoundError or MemoryError, and the cache is only rebuilt
+        return None
+    if cached_key != key or not isinstance(index, tuple) or len(index) != size:
+        return None
+    return index
+
+
+def _save_cache(cache_path, key, index):
+    """Writes `index` to `cache_path` under `key`. The cache is optional, so
+    failing to write it only warns.
+    """
+    # written to a temporary file first so that concurrent readers, e.g.
+    # other trainers of a distributed job, never see a partial cache
+    tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((key, index), f, protocol=4)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        warnings.warn("failed to write the dataset index cache {}: {}".format(
+            cache_path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _check_loader(loader):
+    """Returns whether `loader` selects the io_uring batch reader."""
+    if isinstance(loader, str):
+        if loader != 'io_uring':
+            raise ValueError(
+                "loader should be a callable or 'io_uring', but got {}".format(
+                    loader))
+        if liburing is None:
+            raise ImportError(
+                "loader='io_uring' requires the liburing package on Linux, "
+                "please install it by `pip install liburing`")
+        return True
+    return False
+
+
+def _get_thread_pool(dataset):
+    """Returns the thread pool `dataset` loads batches with, creating it on
+    first use, or None if its num_threads is 0. Threads do not survive fork,
+    so a pool inherited by a DataLoader worker process is replaced by a new
+    one.
+    """
+    if dataset.num_threads == 0:
+        return None
+    pid = os.getpid()
+    if dataset._tpool is None or dataset._tpool_pid != pid:
+        dataset._tpool = ThreadPoolExecutor(max_workers=dataset.num_threads)
+        dataset._tpool_pid = pid
+    return dataset._tpool
+
+
+def _load_batch(dataset, indices, paths):
+    """Loads the samples at `indices`, whose files are at `paths`,
+    concurrently on the thread pool of `dataset`, or one by one if it has
+    none, and transforms them if it has a transform.
+    """
+    pool = _get_thread_pool(dataset)
+    map_fn = map if pool is None else pool.map
+    transform = dataset.transform
+    if dataset._use_uring:
+        load, items = _cv2_decode, _uring_read_files(paths, pool)
+    elif dataset.prefetch > 0:
+        prefetcher = _read_ahead(dataset, indices)
+        load = lambda path: _cv2_decode(prefetcher.get(path))
+        items = paths
+    else:
+        load, items = dataset.loader, paths
+    if transform is None:
+        return list(map_fn(load, items))
+    return list(map_fn(lambda item: transform(load(item)), items))
+
+
+class _SampleList(Sequence):
+    """A read-only sequence of the (path, class_index) samples of a
+    DatasetFolder, which reads them from its sample_paths and targets on
+    access instead of holding a tuple per sample.
+    """
+
+    __slots__ = ('_paths', '_targets')
+
+    def __init__(self, paths, targets):
+        self._paths = paths
+        self._targets = targets
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(zip(self._paths[index], self._targets[index].tolist()))
+        return self._paths[index], int(self._targets[index])
+
+    def __iter__(self):
+        return zip(self._paths, self._targets.tolist())
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b
+                                               for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
 
-    return images
+class _FilePrefetcher(object):
+    """Reads files into memory on a background thread ahead of use.
+
+    Paths passed to `request` are read in order by the thread, at most
+    `depth` of them queued at a time. `get` returns the bytes of a
+    requested path, waiting for its read if needed, and reads the file
+    itself if the path was never requested. At most `2 * depth` unclaimed
+    buffers are kept, the oldest are dropped first, so random access
+    patterns do not grow memory.
+    """
+
+    def __init__(self, depth):
+        self._depth = depth
+        self._queue = queue.Queue(maxsize=depth)
+        self._cond = threading.Condition()
+        self._pending = set()
+        self._buffers = collections.OrderedDict()
+        self._closed = False
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None or self._closed:
+                return
+            try:
+                buf = _read_file(path)
+            except OSError:
+                # left for `get` to read again and raise in the caller
+                buf = None
+            with self._cond:
+                if path in self._pending:
+                    self._buffers[path] = buf
+                    while len(self._buffers) > 2 * self._depth:
+                        dropped, _ = self._buffers.popitem(last=False)
+                        self._pending.discard(dropped)
+                self._cond.notify_all()
+
+    def request(self, path):
+        with self._cond:
+            if self._closed or path in self._pending:
+                return
+            self._pending.add(path)
+        try:
+            self._queue.put_nowait(path)
+        except queue.Full:
+            with self._cond:
+                self._pending.discard(path)
+
+    def get(self, path):
+        with self._cond:
+            while path in self._pending and path not in self._buffers:
+                self._cond.wait()
+            self._pending.discard(path)
+            buf = self._buffers.pop(path, None)
+        if buf is None:
+            buf = _read_file(path)
+        return buf
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+        # wakes up a thread waiting for work, a thread with queued work
+        # sees the flag after its next read instead
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+def _get_prefetcher(dataset):
+    """Returns the file prefetcher of `dataset`, creating it on first use
+    and again after fork, like `_get_thread_pool`.
+    """
+    pid = os.getpid()
+    if dataset._prefetcher is None or dataset._prefetcher_pid != pid:
+        dataset._prefetcher = _FilePrefetcher(dataset.prefetch)
+        dataset._prefetcher_pid = pid
+        weakref.finalize(dataset, dataset._prefetcher.close)
+    return dataset._prefetcher
+
+
+def _read_ahead(dataset, indices):
+    """Returns the file prefetcher of `dataset` after requesting the
+    `dataset.prefetch` samples this process loads after `indices`, if
+    `indices` continue its previous access in index order. Shuffled access
+    can not be predicted, so it reads nothing ahead instead of files never
+    used.
+
+    A DataLoader with several workers hands its batches to the workers in
+    turn, so each worker predicts its next batch `num_workers` batches of
+    the same size after its current one.
+    """
+    prefetcher = _get_prefetcher(dataset)
+    if len(indices) == 0:
+        return prefetcher
+    worker_info = get_worker_info()
+    worker_id, num_workers = 0, 1
+    if worker_info is not None:
+        worker_id, num_workers = worker_info.id, worker_info.num_workers
+    expected = dataset._next_index
+    if expected is None:
+        # the first batch of a worker follows those of the workers before it
+        expected = worker_id * len(indices)
+    start = indices[0]
+    sequential = start == expected and all(index == start + i
+                                           for i, index in enumerate(indices))
+    dataset._next_index = indices[-1] + 1 + (num_workers - 1) * len(indices)
+    if sequential:
+        end = min(dataset._next_index + dataset.prefetch, len(dataset))
+        for i in range(dataset._next_index, end):
+            prefetcher.request(dataset.sample_paths[i])
+    return prefetcher
 
 
 class DatasetFolder(Dataset):
@@ -70,20 +497,53 @@ class DatasetFolder(Dataset):
 
     Args:
         root (string): Root directory path.
-        loader (callable|optional): A function to load a sample given its path.
+        loader (callable|str|optional): A function to load a sample given its
+            path, or 'io_uring' to read the files of each batch loaded by
+            `__getitems__` with batched io_uring submissions and decode them
+            with OpenCV. 'io_uring' needs Linux and the liburing package, and
+            helps with many small files on fast NVMe storage.
         extensions (tuple[str]|optional): A list of allowed extensions.
-            both extensions and is_valid_file should not be passed.
+            Default: IMG_EXTENSIONS if is_valid_file is not passed either.
         transform (callable|optional): A function/transform that takes in
             a sample and returns a transformed version.
         is_valid_file (callable|optional): A function that takes path of a file
-            and check if the file is a valid file (used to check of corrupt files)
-            both extensions and is_valid_file should not be passed.
+            and check if the file is a valid file (used to check of corrupt files).
+            If extensions are passed too, it is only called for the files
+            with one of them.
+        sort (bool|optional): Whether to sort the samples of each class by
+            directory, then by file name. If False, samples are kept in
+            directory order, which saves the sort when the samples are
+            shuffled anyway. Default: True.
+        cache_path (str|optional): A file to cache the samples in. If it
+            holds an index built from the same root, classes, extensions,
+            sort and is_valid_file, the walk of the class folders is skipped.
+            is_valid_file is compared by its module and qualified name only,
+            so the cache should be removed if its code changes. The cache is
+            rebuilt when entries directly under root change, but not when
+            files inside the class folders do. Default: None, no cache.
+        prefetch (int|optional): The number of upcoming samples whose files
+            are read on a background thread while the current sample or
+            batch is decoded and transformed. Files are only read ahead
+            while samples or batches are accessed in index order, e.g. by a
+            DataLoader without shuffle; with several DataLoader workers each
+            one reads ahead the batch it is handed next. Only supported with
+            the default loader. Default: 0, no prefetching.
+        num_threads (int|optional): The number of threads `__getitems__`
+            loads and transforms the samples of a batch with. 0 loads them
+            one by one on the calling thread, e.g. when DataLoader worker
+            processes already load batches in parallel. Default: 8.
 
      Attributes:
         classes (list): List of the class names.
         class_to_idx (dict): Dict with items (class_name, class_index).
-        samples (list): List of (sample path, class_index) tuples
-        targets (list): The class_index value for each image in the dataset
+        sample_paths (list): List of sample paths.
+        targets (numpy.ndarray): The class_index value for each image in the
+            dataset, aligned with sample_paths. Its dtype is the smallest of
+            uint8, uint16 and int32 which holds every class index. Targets
+            assigned through samples keep the dtype NumPy infers for them
+            unless they are all non-negative integers.
+        samples (Sequence): Read-only sequence of (sample path, class_index)
+            tuples, read from sample_paths and targets on access.
 
     Example:
 
@@ -117,31 +577,104 @@ class DatasetFolder(Dataset):
             shutil.rmtree(temp_dir)
     """
 
+    _tpool = None
+    _tpool_pid = None
+    _prefetcher = None
+    _prefetcher_pid = None
+    # the index which continues the access in index order, None before the
+    # first access
+    _next_index = None
+
     def __init__(self,
                  root,
                  loader=None,
                  extensions=None,
                  transform=None,
-                 is_valid_file=None):
+                 is_valid_file=None,
+                 sort=True,
+                 cache_path=None,
+                 prefetch=0,
+                 num_threads=8):
+        self._use_uring = _check_loader(loader)
+        if prefetch > 0 and loader is not None:
+            raise ValueError(
+                "prefetch is only supported with the default loader")
         self.root = root
         self.transform = transform
-        if extensions is None:
+        self.prefetch = prefetch
+        self.num_threads = num_threads
+        if extensions is None and is_valid_file is None:
             extensions = IMG_EXTENSIONS
+        self._file_filters = _file_filters(extensions, is_valid_file)
         classes, class_to_idx = self._find_classes(self.root)
-        samples = make_dataset(self.root, class_to_idx, extensions,
-                               is_valid_file)
-        if len(samples) == 0:
-            raise (RuntimeError(
-                "Found 0 files in subfolders of: " + self.root + "\n"
-                "Supported extensions are: " + ",".join(extensions)))
+        cache_key = None
+        if cache_path is not None:
+            cache_key = _cache_key(self, self.root, extensions, is_valid_file,
+                                   sort, class_to_idx)
+        index = _load_cache(cache_path, cache_key, 2)
+        if index is not None:
+            sample_paths, targets = index
+        else:
+            sample_paths, targets = _make_dataset(self.root, class_to_idx,
+                                                  self._file_filters, sort)
+            if cache_path is not None and len(sample_paths) > 0:
+                _save_cache(cache_path, cache_key, (sample_paths, targets))
+        if len(sample_paths) == 0:
+            raise _no_samples_error(self.root, extensions)
 
-        self.loader = cv2_loader if loader is None else loader
+        if loader is None or self._use_uring:
+            loader = cv2_loader
+        if prefetch > 0:
+            # chosen once here instead of checked by __getitem__ per sample
+            loader = self._load_prefetched
+        self.loader = loader
         self.extensions = extensions
 
         self.classes = classes
         self.class_to_idx = class_to_idx
-        self.samples = samples
-        self.targets = [s[1] for s in samples]
+        self.sample_paths = sample_paths
+        self.targets = targets
+
+    def __getstate__(self):
+        # the thread pool, prefetcher and targets memoryview can not be
+        # pickled, they are rebuilt after unpickling or on first use
+        state = self.__dict__.copy()
+        for name in ('_tpool', '_tpool_pid', '_prefetcher', '_prefetcher_pid',
+                     '_target_view'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.targets = self._targets
+
+    @property
+    def targets(self):
+        return self._targets
+
+    @targets.setter
+    def targets(self, targets):
+        self._targets = np.asarray(targets)
+        # indexing a memoryview of the targets gives Python ints without
+        # creating a NumPy scalar first, which costs as much as a sample
+        # lookup itself
+        self._target_view = memoryview(self._targets)
+
+    @property
+    def samples(self):
+        return _SampleList(self.sample_paths, self.targets)
+
+    @samples.setter
+    def samples(self, samples):
+        self.sample_paths = list(map(operator.itemgetter(0), samples))
+        targets = np.asarray(list(map(operator.itemgetter(1), samples)))
+        # only class indices are narrowed, other targets such as negative or
+        # float labels are kept as they are
+        if len(targets) == 0 or (targets.dtype.kind in 'iu'
+                                 and targets.min() >= 0):
+            targets = targets.astype(
+                _target_dtype(int(targets.max(initial=-1)) + 1))
+        self.targets = targets
 
     def _find_classes(self, dir):
         """
@@ -157,7 +690,20 @@ class DatasetFolder(Dataset):
         """
         if sys.version_info >= (3, 5):
             # Faster and available in Python 3.5 and above
-            classes = [d.name for d in os.scandir(dir) if d.is_dir()]
+            entries = list(os.scandir(dir))
+            pool = None
+            if len(entries) > _PARALLEL_SCAN_THRESHOLD:
+                pool = _get_thread_pool(self)
+            if pool is not None:
+                # is_dir may need a stat per entry, e.g. on NFS, so many
+                # entries are checked concurrently
+                is_dirs = pool.map(os.DirEntry.is_dir, entries)
+            else:
+                is_dirs = [d.is_dir() for d in entries]
+            classes = [
+                sys.intern(d.name) for d, is_dir in zip(entries, is_dirs)
+                if is_dir
+            ]
         else:
             classes = [
                 d for d in os.listdir(dir)
@@ -175,23 +721,291 @@ class DatasetFolder(Dataset):
         Returns:
             tuple: (sample, target) where target is class_index of the target class.
         """
-        path, target = self.samples[index]
+        path = self.sample_paths[index]
         sample = self.loader(path)
         if self.transform is not None:
             sample = self.transform(sample)
+        return sample, self._target_view[index]
+
+    def _load_prefetched(self, path):
+        """The loader of a dataset with prefetch. A path which continues the
+        access in index order reads the following files ahead. The index of
+        any other path is unknown, so the access in index order is only
+        picked up again from the first sample.
+        """
+        index = self._next_index or 0
+        if index < len(self.sample_paths) and self.sample_paths[index] == path:
+            prefetcher = _read_ahead(self, (index, ))
+        else:
+            prefetcher = _get_prefetcher(self)
+            self._next_index = None
+        return _cv2_decode(prefetcher.get(path))
 
-        return sample, target
+    def __getitems__(self, indices):
+        """
+        Args:
+            indices (list[int]): Indices of a batch.
+
+        Returns:
+            list: (sample, target) tuples of the batch, loaded and
+                transformed concurrently on a thread pool.
+        """
+        if type(self).__getitem__ is not DatasetFolder.__getitem__:
+            # a subclass loading its samples in its own __getitem__ keeps
+            # doing so for batches, one by one as without __getitems__, since
+            # its __getitem__ may not be safe to call from several threads
+            return [self[i] for i in indices]
+        samples = _load_batch(self, indices,
+                              [self.sample_paths[i] for i in indices])
+        return list(zip(samples, self.targets[indices].tolist()))
 
     def __len__(self):
-        return len(self.samples)
+        return len(self.sample_paths)
+
+
+def _iter_worker_share(iterable):
+    """Yields the items of `iterable` which fall to the calling DataLoader
+    worker, every `num_workers`-th item starting at the worker's id, so that
+    the workers of an IterableDataset do not all yield every sample.
+    """
+    worker_info = get_worker_info()
+    if worker_info is None:
+        return iter(iterable)
+    return itertools.islice(iterable, worker_info.id, None,
+                            worker_info.num_workers)
+
+
+class LazyDatasetFolder(IterableDataset):
+    """An iterable DatasetFolder which discovers its samples while it is
+    iterated instead of walking all class folders in the constructor, so
+    that iteration starts at once on slow or remote storage. The samples
+    are arranged like those of DatasetFolder and yielded in directory
+    order. Only the class folders are listed by the constructor.
+
+    As with every IterableDataset, the samples can not be indexed or
+    shuffled and there is no length. Under a DataLoader with several
+    workers, every worker walks the class folders and yields its share of
+    the samples.
+
+    Args:
+        root (string): Root directory path.
+        loader (callable|optional): A function to load a sample given its
+            path.
+        extensions (tuple[str]|optional): A list of allowed extensions.
+            Default: IMG_EXTENSIONS if is_valid_file is not passed either.
+        transform (callable|optional): A function/transform that takes in
+            a sample and returns a transformed version.
+        is_valid_file (callable|optional): A function that takes path of a file
+            and check if the file is a valid file (used to check of corrupt files).
+            If extensions are passed too, it is only called for the files
+            with one of them.
+
+     Attributes:
+        classes (list): List of the class names.
+        class_to_idx (dict): Dict with items (class_name, class_index).
+
+    Example:
+
+        .. code-block:: python
+
+            import os
+            import cv2
+            import tempfile
+            import shutil
+            import numpy as np
+            from paddle.vision.datasets import LazyDatasetFolder
+
+            def make_fake_dir():
+                data_dir = tempfile.mkdtemp()
+
+                for i in range(2):
+                    sub_dir = os.path.join(data_dir, 'class_' + str(i))
+                    if not os.path.exists(sub_dir):
+                        os.makedirs(sub_dir)
+                    for j in range(2):
+                        fake_img = (np.random.random((32, 32, 3)) * 255).astype('uint8')
+                        cv2.imwrite(os.path.join(sub_dir, str(j) + '.jpg'), fake_img)
+                return data_dir
+
+            temp_dir = make_fake_dir()
+            data_folder = LazyDatasetFolder(temp_dir)
+
+            for sample, target in data_folder:
+                break
+
+            shutil.rmtree(temp_dir)
+    """
+
+    _tpool = None
+    _tpool_pid = None
+    # the class folders are found like those of DatasetFolder
+    num_threads = 8
+    _find_classes = DatasetFolder._find_classes
+
+    def __init__(self,
+                 root,
+                 loader=None,
+                 extensions=None,
+                 transform=None,
+                 is_valid_file=None):
+        self.root = root
+        self.transform = transform
+        if extensions is None and is_valid_file is None:
+            extensions = IMG_EXTENSIONS
+        self._file_filters = _file_filters(extensions, is_valid_file)
+        self.loader = cv2_loader if loader is None else loader
+        self.extensions = extensions
+        self.classes, self.class_to_idx = self._find_classes(self.root)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_tpool', None)
+        state.pop('_tpool_pid', None)
+        return state
+
+    def _iter_samples(self):
+        """Yields (path, class_index) of each sample while walking the
+        class folders.
+        """
+        root = os.path.expanduser(self.root)
+        for target in self.classes:
+            class_index = self.class_to_idx[target]
+            for path in _iter_files(os.path.join(root, target),
+                                    *self._file_filters):
+                yield path, class_index
+
+    def __iter__(self):
+        for path, target in _iter_worker_share(self._iter_samples()):
+            sample = self.loader(path)
+            if self.transform is not None:
+                sample = self.transform(sample)
+            yield sample, target
+
+    def __len__(self):
+        # a TypeError, unlike the NotImplementedError of Dataset, lets
+        # list() and other length hints fall back to plain iteration
+        raise TypeError("{} has no length".format(type(self).__name__))
 
 
 IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.ppm', '.bmp', '.pgm', '.tif',
                   '.tiff', '.webp')
 
 
+def _read_file(path):
+    with open(path, 'rb') as f:
+        if _HAS_FADVISE:
+            # the whole file is read front to back
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return f.read()
+
+
+def _cv2_decode(buf):
+    if len(buf) == 0:
+        # cv2.imdecode raises on an empty buffer, where cv2.imread returns
+        # None for an empty file
+        return None
+    return cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+
+
 def cv2_loader(path):
-    return cv2.imread(path)
+    # the file is read in one call and decoded from memory, like the files
+    # read ahead or with io_uring. Unlike cv2.imread, a file which can not
+    # be read raises OSError instead of returning None.
+    return _cv2_decode(_read_file(path))
+
+
+# the number of reads submitted to an io_uring at once
+_URING_ENTRIES = 64
+
+_uring_local = threading.local()
+
+
+class _Uring(object):
+    """An io_uring and its completion entry, owned by one thread. The ring
+    is exited once the holder is collected, which happens when its thread
+    exits and the thread-local storage holding it is cleared, or when it is
+    replaced after fork.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.ring = liburing.Ring()
+        self.cqe = liburing.Cqe()
+        liburing.io_uring_queue_init(_URING_ENTRIES, self.ring)
+        weakref.finalize(self, liburing.io_uring_queue_exit, self.ring)
+
+
+def _get_uring():
+    """Returns the io_uring and completion entry of the calling thread,
+    creating them on first use and again after fork. A ring lives as long
+    as its thread, so every DataLoader worker submits to its own ring.
+    """
+    uring = getattr(_uring_local, 'uring', None)
+    if uring is None or uring.pid != os.getpid():
+        uring = _uring_local.uring = _Uring()
+    return uring.ring, uring.cqe
+
+
+def _open_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return fd, os.fstat(fd).st_size
+    except OSError:
+        os.close(fd)
+        raise
+
+
+def _uring_read_files(paths, pool):
+    """Reads the files at `paths` into bytearrays with io_uring.
+
+    The files are opened on `pool`, or on the calling thread if it is None,
+    then their reads are submitted in batches of `_URING_ENTRIES`, one
+    system call per batch, and reaped as they complete. A short read falls
+    back to a plain read of the file.
+    """
+    if pool is None:
+        opens = [functools.partial(_open_file, path) for path in paths]
+    else:
+        opens = [pool.submit(_open_file, path).result for path in paths]
+    files = []
+    error = None
+    for open_file in opens:
+        try:
+            files.append(open_file())
+        except OSError as e:
+            error = error or e
+    try:
+        if error is not None:
+            raise error
+
+        ring, cqe = _get_uring()
+        bufs = [bytearray(size) for _, size in files]
+        for start in range(0, len(files), _URING_ENTRIES):
+            end = min(start + _URING_ENTRIES, len(files))
+            for i in range(start, end):
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_read(sqe, files[i][0], bufs[i], 0)
+                liburing.io_uring_sqe_set_data64(sqe, i)
+            liburing.io_uring_submit(ring)
+
+            # every completion is reaped before raising, so that none is
+            # left in the ring for the next batch
+            for _ in range(start, end):
+                liburing.io_uring_wait_cqe(ring, cqe)
+                entry = cqe[0]
+                i = liburing.io_uring_cqe_get_data64(entry)
+                res = entry.res
+                liburing.io_uring_cqe_seen(ring, entry)
+                if res < 0:
+                    error = error or OSError(-res, os.strerror(-res), paths[i])
+                elif res < len(bufs[i]):
+                    bufs[i] = _read_file(paths[i])
+            if error is not None:
+                raise error
+        return bufs
+    finally:
+        for fd, _ in files:
+            os.close(fd)
 
 
 class ImageFolder(Dataset):
@@ -203,14 +1017,34 @@ class ImageFolder(Dataset):
 
     Args:
         root (string): Root directory path.
-        loader (callable, optional): A function to load a sample given its path.
+        loader (callable|str, optional): A function to load a sample given its
+            path, or 'io_uring' to read the files of each batch loaded by
+            `__getitems__` with batched io_uring submissions and decode them
+            with OpenCV. 'io_uring' needs Linux and the liburing package, and
+            helps with many small files on fast NVMe storage.
         extensions (tuple[string], optional): A list of allowed extensions.
-            both extensions and is_valid_file should not be passed.
+            Default: IMG_EXTENSIONS if is_valid_file is not passed either.
         transform (callable, optional): A function/transform that takes in
             a sample and returns a transformed version.
         is_valid_file (callable, optional): A function that takes path of a file
-            and check if the file is a valid file (used to check of corrupt files)
-            both extensions and is_valid_file should not be passed.
+            and check if the file is a valid file (used to check of corrupt files).
+            If extensions are passed too, it is only called for the files
+            with one of them.
+        sort (bool, optional): Whether to sort the samples by directory,
+            then by file name. If False, samples are kept in directory order,
+            which saves the sort when the samples are shuffled anyway.
+            Default: True.
+        cache_path (str, optional): A file to cache the samples in. If it
+            holds an index built from the same root, extensions, sort and
+            is_valid_file, the directory walk is skipped. is_valid_file is
+            compared by its module and qualified name only, so the cache
+            should be removed if its code changes. The cache is rebuilt when
+            entries directly under root change, but not when files in deeper
+            folders do. Default: None, no cache.
+        num_threads (int, optional): The number of threads `__getitems__`
+            loads and transforms the samples of a batch with. 0 loads them
+            one by one on the calling thread, e.g. when DataLoader worker
+            processes already load batches in parallel. Default: 8.
 
      Attributes:
         samples (list): List of sample path
@@ -247,36 +1081,45 @@ class ImageFolder(Dataset):
             shutil.rmtree(temp_dir)
      """
 
+    _tpool = None
+    _tpool_pid = None
+    prefetch = 0
+
     def __init__(self,
                  root,
                  loader=None,
                  extensions=None,
                  transform=None,
-                 is_valid_file=None):
+                 is_valid_file=None,
+                 sort=True,
+                 cache_path=None,
+                 num_threads=8):
+        self._use_uring = _check_loader(loader)
         self.root = root
-        if extensions is None:
+        self.num_threads = num_threads
+        if extensions is None and is_valid_file is None:
             extensions = IMG_EXTENSIONS
+        self._file_filters = _file_filters(extensions, is_valid_file)
 
-        samples = []
-        path = os.path.expanduser(root)
-
-        if extensions is not None:
-
-            def is_valid_file(x):
-                return has_valid_extension(x, extensions)
-
-        for root, _, fnames in sorted(os.walk(path, followlinks=True)):
-            for fname in sorted(fnames):
-                f = os.path.join(root, fname)
-                if is_valid_file(f):
-                    samples.append(f)
+        cache_key = None
+        if cache_path is not None:
+            cache_key = _cache_key(self, root, extensions, is_valid_file, sort)
+        index = _load_cache(cache_path, cache_key, 1)
+        if index is not None:
+            samples, = index
+        else:
+            samples = list(self._iter_samples())
+            if sort:
+                samples.sort(key=os.path.split)
+            if cache_path is not None and len(samples) > 0:
+                _save_cache(cache_path, cache_key, (samples, ))
 
         if len(samples) == 0:
-            raise (RuntimeError(
-                "Found 0 files in subfolders of: " + self.root + "\n"
-                "Supported extensions are: " + ",".join(extensions)))
+            raise _no_samples_error(self.root, extensions)
 
-        self.loader = cv2_loader if loader is None else loader
+        if loader is None or self._use_uring:
+            loader = cv2_loader
+        self.loader = loader
         self.extensions = extensions
         self.samples = samples
         self.transform = transform
@@ -295,5 +1138,107 @@ class ImageFolder(Dataset):
             sample = self.transform(sample)
         return [sample]
 
+    def __getitems__(self, indices):
+        """
+        Args:
+            indices (list[int]): Indices of a batch.
+
+        Returns:
+            list: [sample] lists of the batch, loaded and transformed
+                concurrently on a thread pool.
+        """
+        if type(self).__getitem__ is not ImageFolder.__getitem__:
+            return [self[i] for i in indices]
+        samples = _load_batch(self, indices, [self.samples[i] for i in indices])
+        return [[sample] for sample in samples]
+
+    def _iter_samples(self):
+        """Yields the path of each sample while walking root."""
+        for path in _iter_files(os.path.expanduser(self.root),
+                                *self._file_filters):
+            yield path
+
     def __len__(self):
         return len(self.samples)
+
+
+class LazyImageFolder(IterableDataset):
+    """An iterable ImageFolder which discovers its samples while it is
+    iterated instead of walking root in the constructor, so that iteration
+    starts at once on slow or remote storage. The samples are yielded in
+    directory order.
+
+    As with every IterableDataset, the samples can not be indexed or
+    shuffled and there is no length. Under a DataLoader with several
+    workers, every worker walks root and yields its share of the samples.
+
+    Args:
+        root (string): Root directory path.
+        loader (callable, optional): A function to load a sample given its
+            path.
+        extensions (tuple[string], optional): A list of allowed extensions.
+            Default: IMG_EXTENSIONS if is_valid_file is not passed either.
+        transform (callable, optional): A function/transform that takes in
+            a sample and returns a transformed version.
+        is_valid_file (callable, optional): A function that takes path of a file
+            and check if the file is a valid file (used to check of corrupt files).
+            If extensions are passed too, it is only called for the files
+            with one of them.
+
+    Example:
+
+        .. code-block:: python
+
+            import os
+            import cv2
+            import tempfile
+            import shutil
+            import numpy as np
+            from paddle.vision.datasets import LazyImageFolder
+
+            def make_fake_dir():
+                data_dir = tempfile.mkdtemp()
+
+                for i in range(2):
+                    sub_dir = os.path.join(data_dir, 'class_' + str(i))
+                    if not os.path.exists(sub_dir):
+                        os.makedirs(sub_dir)
+                    for j in range(2):
+                        fake_img = (np.random.random((32, 32, 3)) * 255).astype('uint8')
+                        cv2.imwrite(os.path.join(sub_dir, str(j) + '.jpg'), fake_img)
+                return data_dir
+
+            temp_dir = make_fake_dir()
+            data_folder = LazyImageFolder(temp_dir)
+
+            for items in data_folder:
+                break
+
+            shutil.rmtree(temp_dir)
+    """
+
+    _iter_samples = ImageFolder._iter_samples
+
+    def __init__(self,
+                 root,
+                 loader=None,
+                 extensions=None,
+                 transform=None,
+                 is_valid_file=None):
+        self.root = root
+        self.transform = transform
+        if extensions is None and is_valid_file is None:
+            extensions = IMG_EXTENSIONS
+        self._file_filters = _file_filters(extensions, is_valid_file)
+        self.loader = cv2_loader if loader is None else loader
+        self.extensions = extensions
+
+    def __iter__(self):
+        for path in _iter_worker_share(self._iter_samples()):
+            sample = self.loader(path)
+            if self.transform is not None:
+                sample = self.transform(sample)
+            yield [sample]
+
+    def __len__(self):
+        raise TypeError("{} has no length".format(type(self).__name__))